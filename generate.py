@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 import argparse
 import json
-import shutil
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from html import escape
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+
+from fastcopy import fast_copy
 
 
 ROM_EXTENSIONS = {
@@ -29,199 +32,332 @@ ROM_EXTENSIONS = {
 
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
 
+_HTML_ESCAPE_TABLE = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        "\"": "&quot;",
+        "'": "&#x27;",
+    }
+)
+
+# \w is str.isalnum() plus "_", so this keeps the same characters as before.
+_SLUG_STRIP = re.compile(r"[^\w .-]+")
+_SLUG_DASH = re.compile(r"[ ._-]+")
+
+# ASCII titles skip the regexes above: one bytes.translate maps separators to
+# "-" and drops everything that is not [a-z0-9], then dash runs are collapsed.
+_ASCII_SLUG_TABLE = bytes.maketrans(b" ._", b"---")
+_ASCII_SLUG_DELETE = bytes(i for i in range(128) if not (chr(i).isalnum() or chr(i) in " ._-"))
+_ASCII_DASH_RUN = re.compile(rb"-{2,}")
 
-def safe_slug(text: str) -> str:
-    out = []
-    for ch in text.lower():
-        if ch.isalnum():
-            out.append(ch)
-        elif ch in {" ", "-", "_", "."}:
-            out.append("-")
-    slug = "".join(out).strip("-")
-    while "--" in slug:
-        slug = slug.replace("--", "-")
-    return slug or "item"
 
+def esc(text: str) -> str:
+    # Same output as html.escape(text, quote=True), in a single pass.
+    return text.translate(_HTML_ESCAPE_TABLE)
 
-def is_hidden(path: Path) -> bool:
-    return path.name.startswith(".")
+
+def safe_slug(text: str) -> str:
+    if text.isascii():
+        raw = text.encode("ascii").lower().translate(_ASCII_SLUG_TABLE, _ASCII_SLUG_DELETE)
+        return _ASCII_DASH_RUN.sub(b"-", raw).strip(b"-").decode("ascii") or "item"
+    slug = _SLUG_STRIP.sub("", text.lower())
+    slug = _SLUG_DASH.sub("-", slug).strip("-")
+    return slug or "item"
 
 
-def read_game_json(path: Path) -> dict:
+def read_game_json(path: str) -> dict:
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
     except FileNotFoundError:
         return {}
 
 
-def resolve_media_path(game_dir: Path, media_value: Optional[str]) -> Optional[Path]:
+def resolve_media_path(game_dir: str, media_value: Optional[str]) -> Optional[str]:
+    # Returns the media path relative to game_dir; normpath is lexical, so this
+    # costs a single stat.
     if not media_value:
         return None
-    media_path = (game_dir / media_value).resolve()
-    if media_path.exists():
-        return media_path
+    rel_path = os.path.normpath(media_value)
+    if os.path.isabs(rel_path) or rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+        return None
+    if os.path.isfile(os.path.join(game_dir, rel_path)):
+        return rel_path
     return None
 
 
-def copy_media(media_path: Path, game_dir: Path, assets_dir: Path) -> Path:
-    rel_path = media_path.relative_to(game_dir)
-    dest_path = assets_dir / rel_path
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(media_path, dest_path)
-    return dest_path
-
-
-def find_console_entries(console_dir: Path) -> list[Path]:
+def copy_media(game_dir: str, rel_path: str, dest_dir: str, created: set[str], check_fresh: bool = True) -> None:
+    media_path = os.path.join(game_dir, rel_path)
+    dest_path = os.path.join(dest_dir, rel_path)
+    # Copies keep the source mtime, so an unchanged file is skipped after two stats.
+    src_stat = os.stat(media_path)
+    if check_fresh:
+        try:
+            dest_stat = os.stat(dest_path)
+            if dest_stat.st_size == src_stat.st_size and dest_stat.st_mtime_ns >= src_stat.st_mtime_ns:
+                return
+        except FileNotFoundError:
+            pass
+    parent = os.path.dirname(dest_path)
+    if parent not in created:
+        os.makedirs(parent, exist_ok=True)
+        created.add(parent)
+    fast_copy(media_path, dest_path)
+
+
+def copy_media_group(copies: list[tuple[str, str, str]], created: set[str], written: set[str]) -> None:
+    # All copies into one asset directory, in game order. Games whose titles
+    # share a slug share the directory, so the last one wins as in a serial
+    # build; a file already written during this build is always overwritten.
+    for game_dir, rel_path, dest_dir in copies:
+        dest_path = os.path.join(dest_dir, rel_path)
+        copy_media(game_dir, rel_path, dest_dir, created, check_fresh=dest_path not in written)
+        written.add(dest_path)
+
+
+def find_console_entries(console_dir: str) -> list[os.DirEntry]:
     entries = []
-    for entry in console_dir.iterdir():
-        if is_hidden(entry):
-            continue
-        if entry.is_dir() or (entry.is_file() and entry.suffix.lower() in ROM_EXTENSIONS):
-            entries.append(entry)
-    return sorted(entries, key=lambda p: p.name.lower())
-
-
-def build_library(library_dir: Path, out_dir: Path) -> dict:
-    consoles = []
-    assets_dir = out_dir / "assets"
-    assets_dir.mkdir(parents=True, exist_ok=True)
-
-    for console_dir in sorted(library_dir.iterdir(), key=lambda p: p.name.lower()):
-        if not console_dir.is_dir() or is_hidden(console_dir):
-            continue
-
-        console_name = console_dir.name
-        console_slug = safe_slug(console_name)
-        games = []
-
-        for entry in find_console_entries(console_dir):
-            if entry.is_dir():
-                game_dir = entry
-                data = read_game_json(game_dir / "game.json")
-                title = data.get("title") or game_dir.name
-                cover_path = resolve_media_path(game_dir, data.get("cover"))
-                video_path = resolve_media_path(game_dir, data.get("video"))
-                cover_rel = None
-                video_rel = None
-
-                if cover_path:
-                    dest_dir = assets_dir / console_slug / safe_slug(title)
-                    dest_path = copy_media(cover_path, game_dir, dest_dir)
-                    cover_rel = dest_path.relative_to(out_dir).as_posix()
-
-                if video_path:
-                    dest_dir = assets_dir / console_slug / safe_slug(title)
-                    dest_path = copy_media(video_path, game_dir, dest_dir)
-                    video_rel = dest_path.relative_to(out_dir).as_posix()
-
-                games.append(
-                    {
-                        "title": title,
-                        "year": data.get("year"),
-                        "publisher": data.get("publisher"),
-                        "region": data.get("region"),
-                        "tags": data.get("tags") or [],
-                        "notes": data.get("notes"),
-                        "cover": cover_rel,
-                        "video": video_rel,
-                        "source": str(game_dir.relative_to(library_dir)),
-                    }
-                )
-            else:
-                games.append(
-                    {
-                        "title": entry.stem,
-                        "year": None,
-                        "publisher": None,
-                        "region": None,
-                        "tags": [],
-                        "notes": None,
-                        "cover": None,
-                        "video": None,
-                        "source": str(entry.relative_to(library_dir)),
-                    }
-                )
-
-        consoles.append(
-            {
+    with os.scandir(console_dir) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir() or (
+                entry.is_file() and os.path.splitext(entry.name)[1].lower() in ROM_EXTENSIONS
+            ):
+                entries.append(entry)
+    return sorted(entries, key=lambda e: e.name.lower())
+
+
+def build_game(
+    dir_entry: os.DirEntry,
+    console_slug: str,
+    library_prefix: str,
+    assets_dir: str,
+) -> tuple[dict, list[tuple[str, str, str]]]:
+    # Returns the game and its pending media copies as (game_dir, rel_path, dest_dir).
+    game_dir = dir_entry.path
+    source = game_dir[len(library_prefix):]
+    if not dir_entry.is_dir():
+        return {
+            "title": os.path.splitext(dir_entry.name)[0],
+            "year": None,
+            "publisher": None,
+            "region": None,
+            "tags": [],
+            "notes": None,
+            "cover": None,
+            "video": None,
+            "source": source,
+        }, []
+
+    data = read_game_json(os.path.join(game_dir, "game.json"))
+    title = data.get("title") or dir_entry.name
+    cover_path = resolve_media_path(game_dir, data.get("cover"))
+    video_path = resolve_media_path(game_dir, data.get("video"))
+    cover_rel = None
+    video_rel = None
+    copies = []
+
+    if cover_path or video_path:
+        title_slug = safe_slug(title)
+        dest_dir = os.path.join(assets_dir, console_slug, title_slug)
+        url_prefix = f"assets/{console_slug}/{title_slug}/"
+
+    if cover_path:
+        copies.append((game_dir, cover_path, dest_dir))
+        cover_rel = url_prefix + cover_path.replace(os.sep, "/")
+
+    if video_path:
+        copies.append((game_dir, video_path, dest_dir))
+        video_rel = url_prefix + video_path.replace(os.sep, "/")
+
+    return {
+        "title": title,
+        "year": data.get("year"),
+        "publisher": data.get("publisher"),
+        "region": data.get("region"),
+        "tags": data.get("tags") or [],
+        "notes": data.get("notes"),
+        "cover": cover_rel,
+        "video": video_rel,
+        "source": source,
+    }, copies
+
+
+def iter_consoles(library_dir: Path, out_dir: Path) -> Iterator[dict]:
+    assets_dir = os.path.join(out_dir, "assets")
+    os.makedirs(assets_dir, exist_ok=True)
+    # Directories already made under assets/, shared by all games so that
+    # sibling media files do not each repeat the mkdir.
+    created = {assets_dir}
+    # Asset files written during this build.
+    written = set()
+
+    # Entry paths from os.scandir all start with this, so sources are a slice.
+    library_prefix = os.path.join(str(library_dir), "")
+    with os.scandir(library_dir) as it:
+        console_entries = [e for e in it if not e.name.startswith(".") and e.is_dir()]
+
+    # Games are independent and mostly wait on disk I/O, so they are built in
+    # threads; results are collected in submission order to keep output stable.
+    pending = []
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for console_entry in sorted(console_entries, key=lambda e: e.name.lower()):
+            console_slug = safe_slug(console_entry.name)
+            futures = [
+                executor.submit(build_game, dir_entry, console_slug, library_prefix, assets_dir)
+                for dir_entry in find_console_entries(console_entry.path)
+            ]
+            pending.append((console_entry.name, console_slug, futures))
+
+        # Each console is yielded as soon as its media is copied, while later
+        # consoles keep building. One copy task per asset directory, and one
+        # console's copies at a time, so no file is written by two threads.
+        for console_name, console_slug, futures in pending:
+            games = [future.result() for future in futures]
+            groups: dict[str, list[tuple[str, str, str]]] = {}
+            for _, copies in games:
+                for copy in copies:
+                    groups.setdefault(copy[2], []).append(copy)
+            copy_futures = [
+                executor.submit(copy_media_group, copies, created, written) for copies in groups.values()
+            ]
+            for future in copy_futures:
+                future.result()
+            yield {
                 "name": console_name,
                 "slug": console_slug,
-                "games": games,
+                "games": [game for game, _ in games],
             }
-        )
 
-    generated_at = datetime.now(timezone.utc).isoformat()
-    return {"generated_at": generated_at, "consoles": consoles}
+
+def _json_bytes(value: object) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=True).encode("ascii")
+
+
+def write_library_json(path: Path, generated_at: str, consoles: Iterable[dict]) -> list[dict]:
+    # Compact JSON, written one console at a time to a temporary file that only
+    # replaces the previous library.json once the build has succeeded. The
+    # consoles are returned because index.html needs the total game count first.
+    written = []
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            f.write(b'{"generated_at":' + _json_bytes(generated_at) + b',"consoles":[')
+            for console in consoles:
+                if written:
+                    f.write(b",")
+                f.write(_json_bytes(console))
+                written.append(console)
+            f.write(b"]}")
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, path)
+    return written
+
+
+_HEAD_HTML = """<!doctype html>
+<html lang="fr">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <title>Bibliotheque retrogaming</title>
+  <style>
+    body { font-family: Arial, sans-serif; margin: 24px; }
+    header { margin-bottom: 24px; }
+    .console { margin-bottom: 32px; }
+    .games { display: grid; gap: 12px; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); }
+    .game { border: 1px solid #ddd; border-radius: 8px; padding: 12px; }
+    .game h3 { margin: 8px 0 6px; font-size: 16px; }
+    .meta { color: #555; font-size: 13px; margin: 4px 0; }
+    .tags { color: #666; font-size: 12px; }
+    img.cover { width: 100%; height: auto; border-radius: 6px; }
+    video.preview { width: 100%; border-radius: 6px; }
+  </style>
+</head>
+<body>
+  <header>
+    <h1>Bibliotheque retrogaming</h1>
+"""
+
+_EMPTY_HTML = "  <p>Aucun jeu pour le moment. Ajoutez des dossiers dans library/ et relancez la generation.</p>\n"
+
+_FOOTER_HTML = """</body>
+</html>"""
+
+
+_HAS_COVER = 1
+_HAS_VIDEO = 2
+_HAS_META = 4
+_HAS_TAGS = 8
+_HAS_NOTES = 16
+
+_GAME_FRAGMENTS = (
+    (_HAS_COVER, "\n        <img class=\"cover\" src=\"%(cover)s\" alt=\"%(title)s\">"),
+    (_HAS_VIDEO, "\n        <video class=\"preview\" controls preload=\"metadata\"><source src=\"%(video)s\"></video>"),
+    (0, "\n        <h3>%(title)s</h3>"),
+    (_HAS_META, "\n        <div class=\"meta\">%(meta)s</div>"),
+    (_HAS_TAGS, "\n        <div class=\"tags\">%(tags)s</div>"),
+    (_HAS_NOTES, "\n        <p class=\"meta\">%(notes)s</p>"),
+)
+
+# One format string per combination of optional blocks, so rendering a game is
+# a single dict lookup and % substitution.
+_GAME_TEMPLATES = {
+    mask: "      <article class=\"game\">"
+    + "".join(fragment for flag, fragment in _GAME_FRAGMENTS if flag & mask == flag)
+    + "\n      </article>\n"
+    for mask in range(32)
+}
 
 
-def render_html(library: dict) -> str:
+def render_game(game: dict) -> str:
+    mask = 0
+    values = {"title": esc(str(game["title"]))}
+    if game["cover"]:
+        mask |= _HAS_COVER
+        values["cover"] = esc(game["cover"])
+    if game["video"]:
+        mask |= _HAS_VIDEO
+        values["video"] = esc(game["video"])
+    meta = [str(game[key]) for key in ("year", "publisher", "region") if game[key]]
+    if meta:
+        mask |= _HAS_META
+        values["meta"] = " - ".join(esc(m) for m in meta)
+    if game["tags"]:
+        mask |= _HAS_TAGS
+        values["tags"] = ", ".join(esc(str(t)) for t in game["tags"])
+    if game["notes"]:
+        mask |= _HAS_NOTES
+        values["notes"] = esc(str(game["notes"]))
+    return _GAME_TEMPLATES[mask] % values
+
+
+def iter_html(library: dict) -> Iterator[str]:
     total_games = sum(len(c["games"]) for c in library["consoles"])
-    lines = []
-    lines.append("<!doctype html>")
-    lines.append("<html lang=\"fr\">")
-    lines.append("<head>")
-    lines.append("  <meta charset=\"utf-8\">")
-    lines.append("  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">")
-    lines.append("  <title>Bibliotheque retrogaming</title>")
-    lines.append("  <style>")
-    lines.append("    body { font-family: Arial, sans-serif; margin: 24px; }")
-    lines.append("    header { margin-bottom: 24px; }")
-    lines.append("    .console { margin-bottom: 32px; }")
-    lines.append("    .games { display: grid; gap: 12px; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); }")
-    lines.append("    .game { border: 1px solid #ddd; border-radius: 8px; padding: 12px; }")
-    lines.append("    .game h3 { margin: 8px 0 6px; font-size: 16px; }")
-    lines.append("    .meta { color: #555; font-size: 13px; margin: 4px 0; }")
-    lines.append("    .tags { color: #666; font-size: 12px; }")
-    lines.append("    img.cover { width: 100%; height: auto; border-radius: 6px; }")
-    lines.append("    video.preview { width: 100%; border-radius: 6px; }")
-    lines.append("  </style>")
-    lines.append("</head>")
-    lines.append("<body>")
-    lines.append("  <header>")
-    lines.append("    <h1>Bibliotheque retrogaming</h1>")
-    lines.append(f"    <p>Total : {total_games} jeux</p>")
-    lines.append("  </header>")
+    yield _HEAD_HTML
+    yield f"""    <p>Total : {total_games} jeux</p>
+  </header>
+"""
 
     if not library["consoles"]:
-        lines.append("  <p>Aucun jeu pour le moment. Ajoutez des dossiers dans library/ et relancez la generation.</p>")
+        yield _EMPTY_HTML
 
     for console in library["consoles"]:
-        lines.append("  <section class=\"console\">")
-        lines.append(f"    <h2>{escape(console['name'])} ({len(console['games'])})</h2>")
-        lines.append("    <div class=\"games\">")
+        yield f"""  <section class="console">
+    <h2>{esc(console['name'])} ({len(console['games'])})</h2>
+    <div class="games">
+"""
         for game in console["games"]:
-            lines.append("      <article class=\"game\">")
-            if game["cover"]:
-                lines.append(
-                    f"        <img class=\"cover\" src=\"{escape(game['cover'])}\" alt=\"{escape(game['title'])}\">"
-                )
-            if game["video"]:
-                lines.append(
-                    "        <video class=\"preview\" controls preload=\"metadata\">"
-                    f"<source src=\"{escape(game['video'])}\"></video>"
-                )
-            lines.append(f"        <h3>{escape(game['title'])}</h3>")
-            meta = []
-            if game["year"]:
-                meta.append(str(game["year"]))
-            if game["publisher"]:
-                meta.append(str(game["publisher"]))
-            if game["region"]:
-                meta.append(str(game["region"]))
-            if meta:
-                lines.append(f"        <div class=\"meta\">{' - '.join(escape(m) for m in meta)}</div>")
-            if game["tags"]:
-                tags = ", ".join(escape(str(t)) for t in game["tags"])
-                lines.append(f"        <div class=\"tags\">{tags}</div>")
-            if game["notes"]:
-                lines.append(f"        <p class=\"meta\">{escape(str(game['notes']))}</p>")
-            lines.append("      </article>")
-        lines.append("    </div>")
-        lines.append("  </section>")
-
-    lines.append("</body>")
-    lines.append("</html>")
-    return "\n".join(lines)
+            yield render_game(game)
+        yield """    </div>
+  </section>
+"""
+
+    yield _FOOTER_HTML
 
 
 def main() -> int:
@@ -237,14 +373,12 @@ def main() -> int:
     if not library_dir.exists():
         library_dir.mkdir(parents=True, exist_ok=True)
 
-    library = build_library(library_dir, out_dir)
-
-    (out_dir / "library.json").write_text(
-        json.dumps(library, indent=2, ensure_ascii=True),
-        encoding="utf-8",
-    )
+    generated_at = datetime.now(timezone.utc).isoformat()
+    consoles = write_library_json(out_dir / "library.json", generated_at, iter_consoles(library_dir, out_dir))
+    library = {"generated_at": generated_at, "consoles": consoles}
 
-    (out_dir / "index.html").write_text(render_html(library), encoding="utf-8")
+    with (out_dir / "index.html").open("w", encoding="utf-8", buffering=1 << 20) as f:
+        f.writelines(iter_html(library))
     return 0
 
 
@@ -1,23 +1,25 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
 import shutil
 from pathlib import Path
-from typing import Optional, Set
+from typing import Iterator, Optional, Tuple
+
+from fastcopy import fast_copy
 
 
 IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
 VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".mkv", ".avi"}
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+COVER_STEMS = {"cover", "box", "front"}
+VIDEO_STEMS = {"video", "trailer", "preview"}
 
 
 def safe_game_title(folder_name: str) -> str:
     return folder_name.strip() or "Unknown game"
 
 
-def is_hidden(path: Path) -> bool:
-    return path.name.startswith(".")
-
-
 def copy_folder(src: Path, dest: Path, overwrite: bool) -> None:
     if dest.exists():
         if not overwrite:
@@ -25,36 +27,66 @@ def copy_folder(src: Path, dest: Path, overwrite: bool) -> None:
         shutil.rmtree(dest)
     dest.mkdir(parents=True, exist_ok=True)
 
-    for item in src.rglob("*"):
-        if is_hidden(item):
-            continue
-        if not item.is_file():
-            continue
-        if item.suffix.lower() not in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
-            continue
-        rel = item.relative_to(src)
-        target = dest / rel
-        target.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(item, target)
-
-
-def select_media_file(game_dir: Path, extensions: Set[str], preferred_stems: Set[str]) -> Optional[str]:
-    candidates = []
-    for item in game_dir.rglob("*"):
-        if not item.is_file():
-            continue
-        if item.suffix.lower() not in extensions:
-            continue
-        if is_hidden(item):
-            continue
-        candidates.append(item)
-
-    for item in candidates:
-        if item.stem.lower() in preferred_stems:
-            return item.relative_to(game_dir).as_posix()
-    if candidates:
-        return candidates[0].relative_to(game_dir).as_posix()
-    return None
+    src_root = str(src)
+    dest_root = str(dest)
+    created = {dest_root}
+    for dirpath, dirs, files in os.walk(src_root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        target_dir = os.path.normpath(os.path.join(dest_root, os.path.relpath(dirpath, src_root)))
+        for name in files:
+            if name.startswith("."):
+                continue
+            if os.path.splitext(name)[1].lower() not in MEDIA_EXTENSIONS:
+                continue
+            if target_dir not in created:
+                os.makedirs(target_dir, exist_ok=True)
+                created.add(target_dir)
+            fast_copy(os.path.join(dirpath, name), os.path.join(target_dir, name))
+
+
+def _walk_files(root: str) -> Iterator[os.DirEntry]:
+    # Pre-order in scandir order, like os.walk/rglob, so the first match is the same.
+    stack = [root]
+    while stack:
+        subdirs = []
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+        stack.extend(reversed(subdirs))
+
+
+def _media_rel(path: Optional[str], root: str) -> Optional[str]:
+    if path is None:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def select_media_files(game_dir: Path) -> Tuple[Optional[str], Optional[str]]:
+    # One walk for both kinds; stops as soon as a preferred cover and video are found.
+    root = str(game_dir)
+    cover = video = None
+    first_image = first_video = None
+    for entry in _walk_files(root):
+        stem, ext = os.path.splitext(entry.name)
+        ext = ext.lower()
+        if cover is None and ext in IMAGE_EXTENSIONS:
+            if stem.lower() in COVER_STEMS:
+                cover = entry.path
+            elif first_image is None:
+                first_image = entry.path
+        elif video is None and ext in VIDEO_EXTENSIONS:
+            if stem.lower() in VIDEO_STEMS:
+                video = entry.path
+            elif first_video is None:
+                first_video = entry.path
+        if cover is not None and video is not None:
+            break
+    return _media_rel(cover or first_image, root), _media_rel(video or first_video, root)
 
 
 def ensure_game_json(game_dir: Path) -> None:
@@ -62,8 +94,7 @@ def ensure_game_json(game_dir: Path) -> None:
     if json_path.exists():
         return
 
-    cover = select_media_file(game_dir, IMAGE_EXTENSIONS, {"cover", "box", "front"})
-    video = select_media_file(game_dir, VIDEO_EXTENSIONS, {"video", "trailer", "preview"})
+    cover, video = select_media_files(game_dir)
     data = {"title": safe_game_title(game_dir.name)}
     if cover:
         data["cover"] = cover
@@ -79,11 +110,12 @@ def import_roms(console: str, source_dir: Path, library_dir: Path, overwrite: bo
     console_dir = library_dir / console
     console_dir.mkdir(parents=True, exist_ok=True)
 
-    for game_dir in sorted(source_dir.iterdir(), key=lambda p: p.name.lower()):
-        if not game_dir.is_dir() or is_hidden(game_dir):
-            continue
-        dest_dir = console_dir / game_dir.name
-        copy_folder(game_dir, dest_dir, overwrite=overwrite)
+    with os.scandir(source_dir) as it:
+        game_entries = [e for e in it if not e.name.startswith(".") and e.is_dir()]
+
+    for game_entry in sorted(game_entries, key=lambda e: e.name.lower()):
+        dest_dir = console_dir / game_entry.name
+        copy_folder(Path(game_entry.path), dest_dir, overwrite=overwrite)
         ensure_game_json(dest_dir)
 
     return 0